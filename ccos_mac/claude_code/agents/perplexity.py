@@ -6,9 +6,17 @@ import httpx
 import json
 import os
 import re
-import shutil # Needed for directory removal
+import stat
+import time
+import traceback
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Pattern, AsyncIterator, Union
+
+try:
+    import orjson # Faster parsing of large (reasoning) responses
+except ImportError:
+    orjson = None
 
 # Try to get API key from environment variable first
 API_KEY = os.getenv("PPLX_API_KEY", "")
@@ -18,6 +26,34 @@ TREE_SPACE = "    "
 TREE_BRANCH = "│   "
 TREE_TEE = "├── "
 TREE_LAST = "└── "
+# Max age of a cached tree render, as a backstop against changes made outside the app
+TREE_CACHE_TTL = 10.0
+# Max characters of a referenced file included in the AI context
+FILE_CONTENT_MAX_LEN = 1500
+# Max files kept in the content cache; entries are truncated, so this also bounds its memory
+CONTENT_CACHE_MAX_ENTRIES = 64
+# Extensions never worth sending to the model as text
+BINARY_SUFFIXES = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.pdf', '.zip', '.bin', '.so', '.dylib', '.exe'})
+
+class ResponseStream:
+    """Async iterator over a streamed chat completion's text chunks.
+       aclose() releases the HTTP response even if iteration never started.
+    """
+    def __init__(self, api: "PerplexityAPI", response: httpx.Response):
+        self._api = api
+        self._response = response
+        self._chunks = api._iter_stream(response)
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._chunks
+
+    async def aclose(self):
+        """Stop the stream and close the response; safe to call more than once."""
+        try:
+            await self._chunks.aclose() # Runs _iter_stream's cleanup if it was started
+        finally:
+            await self._response.aclose()
+            self._api.is_processing_api = False
 
 class PerplexityAPI:
     def __init__(self):
@@ -31,27 +67,32 @@ class PerplexityAPI:
                 "Authorization": f"Bearer {API_KEY}",
                 "Content-Type": "application/json"
             },
-            timeout=60.0
+            # Keep the connection alive across user think-time so follow-up queries skip the TCP+TLS handshake
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20, keepalive_expiry=75.0),
+            http2=True,
+            # Per-phase timeouts: a slow model response shouldn't mask a stalled connect
+            timeout=httpx.Timeout(connect=5.0, read=60.0, write=10.0, pool=5.0)
         )
         
-        # Local command handlers
+        # Local command handlers: name -> (handler, takes_arg)
         self.commands = {
-            "help": self._handle_help,
-            "exit": self._handle_exit,
-            "quit": self._handle_exit,
-            "ls": self._handle_ls,
-            "tree": self._handle_ls,
-            "cd": self._handle_cd,
-            "pwd": self._handle_pwd,
-            "create": self._handle_create_file,
-            "touch": self._handle_create_file, # Alias
-            "mkdir": self._handle_mkdir,
-            "rm": self._handle_rm,
-            "delete": self._handle_rm, # Alias
-            "remove": self._handle_rm # Alias
+            "help": (self._handle_help, False),
+            "exit": (self._handle_exit, False),
+            "quit": (self._handle_exit, False),
+            "ls": (self._handle_ls, False),
+            "tree": (self._handle_ls, False),
+            "cd": (self._handle_cd, True),
+            "pwd": (self._handle_pwd, False),
+            "create": (self._handle_create_file, True),
+            "touch": (self._handle_create_file, True), # Alias
+            "mkdir": (self._handle_mkdir, True),
+            "rm": (self._handle_rm, True),
+            "delete": (self._handle_rm, True), # Alias
+            "remove": (self._handle_rm, True) # Alias
         }
         
-        # Natural language command mapping
+        # Natural language command mapping. Direct forms ('touch x', 'rm x', 'mkdir x', ...)
+        # need no pattern: process_query dispatches them through self.commands without regex.
         self.natural_commands = {
             # ls / tree
             r"list(?: files?)?(?: in(?: current)? directory)?": "ls",
@@ -64,37 +105,66 @@ class PerplexityAPI:
             r"show(?: the)? current directory": "pwd",
             # create file
             r"create(?: a)?(?: new)? file(?: named)?\s+([\w./-]+)$": "create",
-            r"touch\s+([\w./-]+)$": "create",
             # create directory
             r"create(?: a)?(?: new)? directory(?: named)?\s+([\w./-]+)$": "mkdir",
-            r"make directory\s+([\w./-]+)$": "mkdir",
-            r"mkdir\s+([\w./-]+)$": "mkdir", # Allow direct command via natural lang too
-            # remove/delete
-            r"delete\s+([\w./-]+)$": "rm",
-            r"remove\s+([\w./-]+)$": "rm",
-            r"rm\s+([\w./-]+)$": "rm" # Allow direct command
+            r"make directory\s+([\w./-]+)$": "mkdir"
         }
+        # Compile once so process_query doesn't re-resolve the patterns on every query.
+        # Entries are (pattern, command_key, has_arg), has_arg meaning the pattern captures an argument.
+        self._nl_patterns: List[Tuple[Pattern[str], str, bool]] = []
+        for pattern, command_key in self.natural_commands.items():
+            compiled = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+            self._nl_patterns.append((compiled, command_key, compiled.groups > 0))
+        # Bucket by leading word so a query only tries the patterns that could possibly match it
+        self._nl_buckets: Dict[str, List[Tuple[Pattern[str], str, bool]]] = {}
+        for nl_pattern in self._nl_patterns:
+            first_word = re.match(r'[a-z]+', nl_pattern[0].pattern).group(0)
+            self._nl_buckets.setdefault(first_word, []).append(nl_pattern)
+        self._file_ref_re = re.compile(r'([\w./-]+\.\w+)')
+        # Matches '..' or any path separator in a single scan
+        self._bad_path_re = re.compile(r'\.\.|[/\\]')
         
         # Initialize current directory
         self.current_dir = os.getcwd()
         self._file_cache: Dict[str, Dict[str, Any]] = {}
+        # (path, mtime_ns, nlink) of the directory _file_cache was built from
+        self._file_cache_key: Optional[Tuple[str, int, int]] = None
+        # Directory listing lines for the AI context, rebuilt only when _file_cache changes
+        self._context_items_cached: Optional[List[str]] = None
+        # Rendered tree lines per root dir: path -> ((mtime_ns, size), cached_at, lines)
+        self._tree_cache: Dict[str, Tuple[Tuple[int, int], float, List[str]]] = {}
+        # LRU of truncated file content per absolute path: path -> (mtime_ns, size, content); survives cd
+        self._content_cache: OrderedDict[str, Tuple[int, int, str]] = OrderedDict()
         self._update_file_cache()
         self.is_processing_api = False
         
     def _update_file_cache(self):
-        """Update the cache of files/dirs in the current directory (non-recursive)."""
+        """Update the cache of files/dirs in the current directory (non-recursive), skipping unchanged dirs."""
+        try:
+            st = os.stat(self.current_dir)
+            key = (self.current_dir, st.st_mtime_ns, st.st_nlink)
+        except OSError:
+            key = None
+        if key is not None and key == self._file_cache_key:
+            return
         self._file_cache.clear()
+        self._file_cache_key = key
+        self._context_items_cached = None
+        file_cache = self._file_cache
         try:
-            for item in os.listdir(self.current_dir):
-                try:
-                    full_path = os.path.join(self.current_dir, item)
-                    is_dir = os.path.isdir(full_path)
-                    self._file_cache[item] = {'is_dir': is_dir, 'content': None}
-                except OSError:
-                     self._file_cache[item] = {'is_dir': False, 'content': None, 'error': 'Permission denied'}
+            # scandir reuses the d_type from the listing, so only symlinks cost an extra stat
+            with os.scandir(self.current_dir) as it:
+                for entry in it:
+                    # Keep the try narrow: is_dir() only raises in the rare stat-fallback case
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                         file_cache[entry.name] = {'is_dir': False, 'error': 'Permission denied'}
+                         continue
+                    file_cache[entry.name] = {'is_dir': is_dir}
         except OSError as e:
             self._file_cache[".error"] = {'is_dir': False, 'content': f"Cannot list directory: {e}"}
-            pass
+            self._file_cache_key = None
                 
     def _handle_help(self) -> Tuple[str, bool]:
         """Handle help command."""
@@ -125,35 +195,70 @@ For AI queries:
         """Handle exit command."""
         return "exit", True
         
-    def _build_tree(self, dir_path: str, prefix: str = "", level: int = 0) -> List[str]:
-        """Recursively build the directory tree lines."""
-        lines = []
-        try:
-            # Ignore hidden files/dirs for cleaner output
-            items = sorted([item for item in os.listdir(dir_path) if not item.startswith('.')])
-        except OSError:
-             return [f"{prefix}{TREE_LAST}[Error reading directory]"]
-             
-        count = len(items)
-        for i, item in enumerate(items):
-            connector = TREE_LAST if i == count - 1 else TREE_TEE
-            item_path = os.path.join(dir_path, item)
+    def _build_tree(self, dir_path: str) -> List[str]:
+        """Build the directory tree lines (up to 3 levels deep) with an explicit stack."""
+        lines: List[str] = []
+        # Entries waiting to be emitted: (entry, prefix, is_last, level).
+        # The prefix string is built once per directory and shared by all of its entries.
+        stack: List[Tuple[os.DirEntry, str, bool, int]] = []
+        
+        def push_children(path: str, prefix: str, level: int):
+            try:
+                # Ignore hidden files/dirs for cleaner output
+                with os.scandir(path) as it:
+                    entries = sorted((entry for entry in it if not entry.name.startswith('.')), key=lambda e: e.name)
+            except OSError:
+                 lines.append(f"{prefix}{TREE_LAST}[Error reading directory]")
+                 return
+            # Push in reverse so siblings pop off in sorted order
+            last = len(entries) - 1
+            for i in range(last, -1, -1):
+                stack.append((entries[i], prefix, i == last, level))
+                
+        push_children(dir_path, "", 0)
+        while stack:
+            entry, prefix, is_last, level = stack.pop()
+            connector = TREE_LAST if is_last else TREE_TEE
+            item = entry.name
             is_dir = False
             try:
-                is_dir = os.path.isdir(item_path)
+                is_dir = entry.is_dir()
             except OSError:
                  item += " [Permission Error]"
                  
             lines.append(f"{prefix}{connector}{item}{'/' if is_dir else ''}")
             
+            # Children are pushed on top, so they're emitted before the next sibling
             if is_dir and level < 3:
-                extension = TREE_SPACE if i == count - 1 else TREE_BRANCH
-                lines.extend(self._build_tree(item_path, prefix + extension, level + 1))
+                extension = TREE_SPACE if is_last else TREE_BRANCH
+                push_children(entry.path, prefix + extension, level + 1)
+        return lines
+        
+    def _mark_dir_changed(self):
+        """Invalidate cached directory views after create/mkdir/rm in the current directory."""
+        # A tree rooted at any ancestor may include the changed entry
+        self._tree_cache.clear()
+        self._file_cache_key = None
+        self._context_items_cached = None
+        
+    def _get_tree_lines(self, dir_path: str) -> List[str]:
+        """Return tree lines for dir_path, reusing the cached render while the directory is unchanged."""
+        try:
+            st = os.stat(dir_path)
+        except OSError:
+            return self._build_tree(dir_path)
+        key = (st.st_mtime_ns, st.st_size)
+        now = time.monotonic()
+        cached = self._tree_cache.get(dir_path)
+        if cached and cached[0] == key and now - cached[1] < TREE_CACHE_TTL:
+            return cached[2]
+        lines = self._build_tree(dir_path)
+        self._tree_cache[dir_path] = (key, now, lines)
         return lines
         
     def _handle_ls(self) -> Tuple[str, bool]:
         """Handle ls/tree command with tree formatting."""
-        tree_lines = self._build_tree(self.current_dir)
+        tree_lines = self._get_tree_lines(self.current_dir)
         if not tree_lines:
             # Check if directory actually exists or if it was an error listing
             if not os.path.exists(self.current_dir):
@@ -190,6 +295,7 @@ For AI queries:
                  
             self.current_dir = new_dir
             os.chdir(new_dir)
+            self._tree_cache.pop(new_dir, None)
             self._update_file_cache()
             return "", True
             
@@ -205,11 +311,15 @@ For AI queries:
         """Handle pwd command."""
         return f"{self.current_dir}", True
         
+    def _invalid_path_component(self, name: str) -> bool:
+        """Check whether name contains '..' or a path separator."""
+        return self._bad_path_re.search(name) is not None
+        
     def _handle_create_file(self, filename: str) -> Tuple[str, bool]:
         """Handle create file command."""
         if not filename:
             return "Usage: create <filename>", True
-        if ".." in filename or "/" in filename or "\\" in filename:
+        if self._invalid_path_component(filename):
             return f"Invalid characters or path components in filename: {filename}", True
             
         filepath = os.path.join(self.current_dir, filename)
@@ -217,7 +327,8 @@ For AI queries:
             if os.path.exists(filepath):
                 return f"File or directory already exists: {filename}", True
             Path(filepath).touch()
-            self._file_cache[filename] = {'is_dir': False, 'content': ""}
+            self._file_cache[filename] = {'is_dir': False}
+            self._mark_dir_changed()
             return f"File created: {filename}", True
         except OSError as e:
              return f"Error creating file '{filename}': {e.strerror}", True
@@ -228,7 +339,7 @@ For AI queries:
         """Handle create directory command."""
         if not dirname:
             return "Usage: mkdir <dirname>", True
-        if ".." in dirname or "/" in dirname or "\\" in dirname:
+        if self._invalid_path_component(dirname):
             return f"Invalid characters or path components in dirname: {dirname}", True
             
         dirpath = os.path.join(self.current_dir, dirname)
@@ -239,7 +350,8 @@ For AI queries:
             os.makedirs(dirpath) # Creates parent dirs if needed, no error if exists due to check above
             
             # Update cache immediately
-            self._file_cache[dirname] = {'is_dir': True, 'content': None}
+            self._file_cache[dirname] = {'is_dir': True}
+            self._mark_dir_changed()
             
             return f"Directory created: {dirname}", True
             
@@ -255,30 +367,36 @@ For AI queries:
         """Handle remove file or empty directory command."""
         if not name:
             return "Usage: rm <file_or_empty_dir_name>", True
-        if ".." in name or name == "." or "/" in name or "\\" in name:
+        if name == "." or self._invalid_path_component(name):
             return f"Invalid characters or path components in name: {name}. Cannot delete relative paths.", True
             
         targetpath = os.path.join(self.current_dir, name)
         
         try:
-            if not os.path.exists(targetpath):
-                # Check lstat for broken symlinks
-                if os.path.lexists(targetpath):
-                     os.remove(targetpath) # Remove broken symlink
-                     if name in self._file_cache: del self._file_cache[name]
-                     return f"Removed broken symbolic link: {name}", True
-                else:
-                     return f"File or directory not found: {name}", True
+            # A single lstat tells us everything: existence, and file/symlink/dir type
+            try:
+                mode = os.lstat(targetpath).st_mode
+            except FileNotFoundError:
+                return f"File or directory not found: {name}", True
 
-            if os.path.isfile(targetpath) or os.path.islink(targetpath):
+            if stat.S_ISLNK(mode) and not os.path.exists(targetpath):
+                os.remove(targetpath) # Remove broken symlink
+                if name in self._file_cache: del self._file_cache[name]
+                self._mark_dir_changed()
+                return f"Removed broken symbolic link: {name}", True
+            if stat.S_ISREG(mode) or stat.S_ISLNK(mode):
                 os.remove(targetpath)
                 if name in self._file_cache: del self._file_cache[name]
+                self._mark_dir_changed()
                 return f"Removed file: {name}", True
-            elif os.path.isdir(targetpath):
+            elif stat.S_ISDIR(mode):
                 # For safety, only remove empty directories with os.rmdir
-                if not os.listdir(targetpath):
+                with os.scandir(targetpath) as it:
+                    is_empty = next(it, None) is None
+                if is_empty:
                     os.rmdir(targetpath)
                     if name in self._file_cache: del self._file_cache[name]
+                    self._mark_dir_changed()
                     return f"Removed empty directory: {name}", True
                 else:
                     return f"Directory not empty: {name}. Use specific tool for recursive removal.", True
@@ -291,103 +409,129 @@ For AI queries:
             return f"Unexpected error removing '{name}': {str(e)}", True
 
     def _get_file_content(self, filename: str) -> Optional[str]:
-        """Get content of a file if it exists in the current directory context."""
+        """Get truncated content of a file in the current directory, re-reading only if it changed on disk."""
         if filename not in self._file_cache or self._file_cache[filename].get('is_dir') or self._file_cache[filename].get('error'):
             return None
+        full_path = os.path.join(self.current_dir, filename)
+        if os.path.splitext(filename)[1].lower() in BINARY_SUFFIXES:
+            return None
         try:
-            if self._file_cache[filename]['content'] is not None:
-                return self._file_cache[filename]['content']
-            full_path = os.path.join(self.current_dir, filename)
-            if os.path.exists(full_path) and os.path.isfile(full_path):
-                content = Path(full_path).read_text(encoding='utf-8')
-                self._file_cache[filename]['content'] = content
-                return content
+            st = os.stat(full_path)
+            if not stat.S_ISREG(st.st_mode):
+                return None
+            cached = self._content_cache.get(full_path)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                self._content_cache.move_to_end(full_path)
+                return cached[2]
+            # Read just past the limit (enough to know it was truncated) instead of the whole file
+            with open(full_path, 'r', encoding='utf-8') as fh:
+                content = fh.read(FILE_CONTENT_MAX_LEN + 1)
+            if '\x00' in content: # Binary file that happens to decode as UTF-8
+                return None
+            # Truncate once at store time rather than on every context build
+            if len(content) > FILE_CONTENT_MAX_LEN:
+                content = content[:FILE_CONTENT_MAX_LEN] + '...'
+            self._content_cache[full_path] = (st.st_mtime_ns, st.st_size, content)
+            self._content_cache.move_to_end(full_path)
+            if len(self._content_cache) > CONTENT_CACHE_MAX_ENTRIES:
+                self._content_cache.popitem(last=False)
+            return content
         except Exception:
-            self._file_cache[filename]['content'] = None 
             pass
         return None
 
-    def _find_file_references(self, query: str) -> List[str]:
-        """Find potential file references in the query, relative to current dir."""
-        potential_files = re.findall(r'([\w./-]+\.\w+)', query)
+    def _find_file_references(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Find up to `limit` file references in the query (in order of mention), relative to current dir."""
+        potential_files = self._file_ref_re.findall(query)
+        if not potential_files:
+            return []
         found_files = []
-        for potential_file in potential_files:
+        # Dedupe up front (keeping order of mention) so each candidate is checked at most once
+        for potential_file in dict.fromkeys(potential_files):
+            # Stop once we have enough; later candidates would cost a stat for nothing
+            if limit is not None and len(found_files) >= limit:
+                break
             if potential_file in self._file_cache and not self._file_cache[potential_file].get('is_dir'):
                 found_files.append(potential_file)
             else:
                  rel_path_check = os.path.join(self.current_dir, potential_file)
                  if os.path.isfile(rel_path_check):
                      if potential_file not in self._file_cache:
-                         self._file_cache[potential_file] = {'is_dir': False, 'content': None}
+                         self._file_cache[potential_file] = {'is_dir': False}
+                         self._context_items_cached = None
                      if not self._file_cache[potential_file].get('is_dir'):
                          found_files.append(potential_file)
-        return list(set(found_files))
+        return found_files
 
     def _get_context(self, query: str) -> Tuple[str, str]:
         """Get relevant context based on the query."""
         model = "sonar-reasoning-pro"
-        files = self._find_file_references(query)
-        context_items = []
-        if '.error' in self._file_cache:
-             context_items.append(f"- Error accessing directory: {self._file_cache['.error']['content']}")
-        elif not self._file_cache:
-             context_items.append("- (empty)")
-        else:
-             # Show only non-hidden items
-             context_items.extend([f"- {f}{'/' if self._file_cache[f].get('is_dir') else ''}" 
-                                   for f in sorted(self._file_cache.keys()) if f != '.error' and not f.startswith('.')]) 
+        # Only the first two referenced files are included, so don't probe beyond that
+        files = self._find_file_references(query, limit=2)
+        if self._context_items_cached is None:
+            context_items = []
+            if '.error' in self._file_cache:
+                 context_items.append(f"- Error accessing directory: {self._file_cache['.error']['content']}")
+            elif not self._file_cache:
+                 context_items.append("- (empty)")
+            else:
+                 # Show only non-hidden items
+                 context_items.extend([f"- {f}{'/' if self._file_cache[f].get('is_dir') else ''}" 
+                                       for f in sorted(self._file_cache.keys()) if f != '.error' and not f.startswith('.')]) 
+            self._context_items_cached = context_items
+        context_items = self._context_items_cached
         context_parts = [
             f"Current Directory: {self.current_dir}",
             "Available files/dirs in current directory (excluding hidden):",
             *context_items
         ]
-        files_to_include = files[:2]
-        if files_to_include:
+        if files:
              context_parts.append("\nRelevant File Content:")
-             for file in files_to_include:
+             for file in files:
                  content = self._get_file_content(file)
                  if content:
-                     max_len = 1500
-                     truncated_content = content[:max_len] + ('...' if len(content) > max_len else '')
-                     context_parts.append(f"\n--- {file} ---\n{truncated_content}\n--- End {file} ---")
+                     context_parts.append(f"\n--- {file} ---\n{content}\n--- End {file} ---")
                  else:
                       context_parts.append(f"\n(Could not read content of {file})" )
         context = "\n".join(context_parts)
         return model, context
 
-    async def process_query(self, query: str) -> Tuple[str, bool]:
+    async def process_query(self, query: str, stream: bool = False) -> Union[Tuple[str, bool], ResponseStream]:
         """Process query: Handle local commands or pass to AI.
-           Returns (response_string, is_command_result)
+           Returns (response_string, is_command_result), or with stream=True a
+           ResponseStream of response text chunks for successful AI requests.
         """
         query_lower = query.lower().strip()
+        first_word = query_lower.split(None, 1)[0] if query_lower else ""
         
-        # 1. Check for exact commands
-        cmd_parts = query.split(maxsplit=1) # Use original query for args preservation
-        exact_cmd = cmd_parts[0].lower()
-        if exact_cmd in self.commands:
-            handler = self.commands[exact_cmd]
-            # Commands needing argument: cd, create, touch, mkdir, rm, delete, remove
-            if exact_cmd in ["cd", "create", "touch", "mkdir", "rm", "delete", "remove"]:
-                arg = cmd_parts[1].strip() if len(cmd_parts) > 1 else ""
-                return handler(arg)
-            else: # ls, tree, pwd, help, exit, quit
-                 return handler()
-
-        # 2. Check for natural language commands
-        for pattern, command_key in self.natural_commands.items():
-            match = re.fullmatch(pattern, query, re.IGNORECASE | re.DOTALL) # Use original query
+        # 1. Check for natural language commands sharing the query's leading word.
+        #    Runs first so 'create file x' isn't taken as 'create' with arg 'file x';
+        #    direct commands (ls, cd, touch, rm, ...) have no bucket and skip regex entirely.
+        for pattern, command_key, has_arg in self._nl_buckets.get(first_word, ()):
+            match = pattern.fullmatch(query) # Use original query
             if match:
-                handler = self.commands.get(command_key)
-                if handler:
+                command = self.commands.get(command_key)
+                if command:
+                    handler, takes_arg = command
                     # Commands needing argument from regex group
-                    if command_key in ['cd', 'create', 'mkdir', 'rm']:
-                        arg = match.group(1).strip() if match.groups() else ""
+                    if takes_arg:
+                        arg = match.group(1).strip() if has_arg else ""
                         return handler(arg) 
-                    else: # ls, tree, pwd
-                         return handler()
+                    return handler()
+
+        # 2. Check for exact commands
+        cmd_parts = query.split(maxsplit=1) # Use original query for args preservation
+        command = self.commands.get(cmd_parts[0].lower()) if cmd_parts else None
+        if command:
+            handler, takes_arg = command
+            if takes_arg:
+                arg = cmd_parts[1].strip() if len(cmd_parts) > 1 else ""
+                return handler(arg)
+            return handler()
 
         # 3. If not a command, process as AI query
         self.is_processing_api = True
+        streaming = False # Once a stream is handed out, it clears the flag when it finishes or is closed
         try:
             model, context = self._get_context(query)
             messages = [
@@ -395,9 +539,21 @@ For AI queries:
                 {"role": "user", "content": query}
             ]
             payload = {"model": model, "messages": messages}
+            if stream:
+                payload["stream"] = True
+                request = self.client.build_request("POST", "/chat/completions", json=payload)
+                response = await self.client.send(request, stream=True)
+                if response.is_error:
+                    try:
+                        await response.aread() # Load the body so the error message below can include it
+                    finally:
+                        await response.aclose()
+                response.raise_for_status()
+                streaming = True
+                return ResponseStream(self, response)
             response = await self.client.post("/chat/completions", json=payload)
             response.raise_for_status()
-            result = response.json()
+            result = orjson.loads(response.content) if orjson else response.json()
             if 'choices' in result and len(result['choices']) > 0:
                 return result['choices'][0]['message']['content'], False
             return "No response received from the model.", False
@@ -408,11 +564,35 @@ For AI queries:
         except httpx.RequestError as e:
              return f"Network error: Could not connect to Perplexity API. {str(e)}", True
         except Exception as e:
-            import traceback
             return f"Unexpected error during API call: {str(e)}\n{traceback.format_exc()}", True
         finally:
-            self.is_processing_api = False
+            if not streaming:
+                self.is_processing_api = False
         
+    async def _iter_stream(self, response: httpx.Response) -> AsyncIterator[str]:
+        """Yield content deltas from a streamed (server-sent events) chat completion."""
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue # Blank separators / comments / other SSE fields
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = orjson.loads(data) if orjson else json.loads(data)
+                except ValueError:
+                    continue # Skip malformed events
+                choices = chunk.get("choices")
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+        except httpx.HTTPError as e:
+            yield f"\n\n(Response stream interrupted: {str(e)})"
+        finally:
+            await response.aclose()
+            self.is_processing_api = False
+
     async def close(self):
         """Close the HTTP client."""
         try:
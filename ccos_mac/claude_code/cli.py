@@ -4,8 +4,8 @@ Command-line interface for the Perplexity AI code assistant.
 
 import typer
 import asyncio
-from typing import Tuple
-from .agents.perplexity import PerplexityAPI
+from typing import Tuple, Union
+from .agents.perplexity import PerplexityAPI, ResponseStream
 from .ui.terminal import TerminalUI
 
 app = typer.Typer()
@@ -15,25 +15,32 @@ def main():
     """Start the Perplexity AI code assistant."""
     # Declare ui here so it's available in except block
     ui = TerminalUI() 
-    api = None # Initialize api to None
     try:
         # Initialize components
         api = PerplexityAPI()
         
-        # Show welcome message
-        ui.show_welcome()
-        
         # Define query handler that updates UI state
-        async def handle_query(query: str) -> Tuple[str, bool]:
-            response, is_command = await api.process_query(query)
+        async def handle_query(query: str) -> Union[Tuple[str, bool], ResponseStream]:
+            # AI responses come back as a chunk stream that the UI renders as it arrives
+            result = await api.process_query(query, stream=True)
             
             # Update UI current directory if it changed
             ui.update_current_dir(api.current_dir)
             
-            return response, is_command
+            return result
             
-        # Start interactive loop
-        asyncio.run(ui.interactive_prompt(handle_query))
+        async def run_session():
+            try:
+                # Show welcome message
+                ui.show_welcome()
+                
+                # Start interactive loop
+                await ui.interactive_prompt(handle_query)
+            finally:
+                # Close the HTTP client on the same event loop that used it
+                await api.close()
+                
+        asyncio.run(run_session())
         
     except ValueError as e:
         # Handle API key error specifically
@@ -45,10 +52,6 @@ def main():
         # Use ui.show_error if available
         ui.show_error(f"Application startup error: {str(e)}")
         raise typer.Exit(1)
-    finally:
-        # Cleanup
-        if api: # Check if api was successfully initialized
-            asyncio.run(api.close())
 
 if __name__ == "__main__":
     app() 
\ No newline at end of file
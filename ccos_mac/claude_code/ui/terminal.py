@@ -3,7 +3,7 @@ Terminal UI design using rich library.
 Handles all terminal rendering and user interaction.
 """
 
-from rich.console import Console
+from rich.console import Console, Group
 from rich.prompt import Prompt
 from rich.panel import Panel
 from rich.layout import Layout
@@ -14,26 +14,99 @@ from rich.align import Align
 from rich.markdown import Markdown
 from rich.spinner import Spinner
 from rich.live import Live
-from typing import Optional, Callable, Tuple, Coroutine, Any
+from typing import Optional, Callable, Tuple, Coroutine, Any, List, AsyncIterable, Union
 import asyncio
+import codecs
+import functools
 import os
 import re
+import sys
 import time # Import time for duration calculation
+import traceback
 from pathlib import Path
 
 # Perplexity theme color
 THEME_COLOR = "#00c5e0"
 THINKING_COLOR = "dim cyan"
 
+# Reasoning block emitted by sonar-reasoning models
+_THINK_RE = re.compile(r"<think>(.*?)</think>", re.DOTALL | re.IGNORECASE)
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+_THINK_OPEN_RE = re.compile(re.escape(_THINK_OPEN), re.IGNORECASE)
+
+# Characters that can start Markdown syntax; replies without any of them (and without a
+# leading "1." style list marker) render the same as plain Text, so the parser is skipped
+_MD_CHARS = frozenset("*_#`[]>\\<&-+|~!=\n")
+
+def _split_reasoning(response: str) -> Tuple[Optional[str], str]:
+    """Split a response into its first <think> block (None if absent) and the text outside all <think> blocks."""
+    lowered = response.lower()
+    if len(lowered) != len(response):
+        # Lowercasing changed some character's length, so indices wouldn't line up; use the regex
+        match = _THINK_RE.search(response)
+        return (match.group(1) if match else None), _THINK_RE.sub("", response)
+    start = lowered.find(_THINK_OPEN)
+    if start < 0:
+        return None, response
+    reasoning = None
+    parts = []
+    pos = 0
+    while start >= 0:
+        end = lowered.find(_THINK_CLOSE, start + len(_THINK_OPEN))
+        if end < 0:
+            break # Unclosed tag is left in place, as the regex would
+        if reasoning is None:
+            reasoning = response[start + len(_THINK_OPEN):end]
+        parts.append(response[pos:start])
+        pos = end + len(_THINK_CLOSE)
+        start = lowered.find(_THINK_OPEN, pos)
+    parts.append(response[pos:])
+    return reasoning, "".join(parts)
+
+def _split_partial_reasoning(response: str) -> Tuple[Optional[str], str]:
+    """Like _split_reasoning, for a response still streaming in: an unclosed <think> block is reasoning so far."""
+    reasoning, answer = _split_reasoning(response)
+    match = _THINK_OPEN_RE.search(answer) # _split_reasoning leaves unclosed tags in place
+    if not match:
+        return reasoning, answer
+    in_progress = answer[match.end():]
+    return (in_progress if reasoning is None else reasoning), answer[:match.start()]
+
 class TerminalUI:
+    # Leading words of commands handled locally (shown without the thinking indicator)
+    LOCAL_PREFIXES = frozenset({"ls", "tree", "cd", "pwd", "create", "touch", "mkdir", "rm", "delete", "remove", "help"})
+
     def __init__(self):
         # Use strip_control_codes=True if encountering issues with raw control chars
         self.console = Console(log_time=False, log_path=False) 
         self.current_dir = os.getcwd()
         self.current_task = None # To store the asyncio task for potential cancellation
+        self._current_stream = None # Response stream being rendered, closed if the turn is abandoned
+        self._welcome_cache: Optional[Tuple[int, str]] = None # (console width, rendered welcome output)
+        self._cwd_display_cache: Optional[Tuple[str, str]] = None # (current_dir, display string)
+        self._prompt_cache: Optional[Tuple[str, Text, str]] = None # (cwd display, parsed prompt Text, rendered ANSI)
+        try:
+            self._home_str: Optional[str] = str(Path.home()) # Resolved once; used to shorten the prompt path
+        except Exception:
+            self._home_str = None # Fallback if home dir can't be determined
+        self._input_future: Optional[asyncio.Future] = None # Resolved by _on_stdin once a full line is buffered
+        self._stdin_buffer = "" # Decoded stdin data not yet returned as a line
+        self._stdin_decoder = None # Incremental decoder for raw stdin reads, created on first use
         
     def show_welcome(self):
         """Display welcome message."""
+        # The welcome screen is static: render it once per terminal width and replay the output
+        width = self.console.width
+        if self._welcome_cache is None or self._welcome_cache[0] != width:
+            with self.console.capture() as capture:
+                self.console.print(self._build_welcome())
+            self._welcome_cache = (width, capture.get())
+        self.console.file.write(self._welcome_cache[1])
+        self.console.file.flush()
+        
+    def _build_welcome(self) -> Group:
+        """Build the welcome panel and usage guide."""
         # Welcome message in a box
         welcome_text = Text()
         welcome_text.append("Plex Code", style=f"bold {THEME_COLOR}")
@@ -63,21 +136,32 @@ class TerminalUI:
         usage_text.append("Ctrl+C", style=THEME_COLOR)
         usage_text.append(" during API calls to interrupt\n", style="dim white")
 
-        # Print everything with proper spacing
-        self.console.print("\n")
-        self.console.print(Align.center(welcome_panel))
-        self.console.print(Align.center(usage_text))
-        self.console.print("\n")
+        # Everything with proper spacing, rendered in a single pass
+        return Group(
+            Text("\n"),
+            Align.center(welcome_panel),
+            Align.center(usage_text),
+            Text("\n")
+        )
         
     async def get_input(self) -> str:
         """Get user input with styled prompt showing current directory."""
         cwd_display = self._get_cwd_display()
-        prompt = f"[{THEME_COLOR}]{cwd_display}[/{THEME_COLOR}]> "
+        # Only re-parse the prompt markup when the displayed directory changes
+        if self._prompt_cache is None or self._prompt_cache[0] != cwd_display:
+            prompt = Text.from_markup(f"[{THEME_COLOR}]{cwd_display}[/{THEME_COLOR}]> ")
+            with self.console.capture() as capture: # Render once with the console's color system
+                self.console.print(prompt, end="")
+            self._prompt_cache = (cwd_display, prompt, capture.get())
         
-        self.console.print(Text.from_markup(prompt), end="")
-        # Use run_in_executor for blocking input()
+        if self.console.is_terminal:
+            # Replay the pre-rendered escape sequence in one write instead of a full Rich print
+            self.console.file.write(self._prompt_cache[2])
+            self.console.file.flush()
+        else:
+            self.console.print(self._prompt_cache[1], end="")
         try:
-             user_input = await asyncio.get_event_loop().run_in_executor(None, input)
+             user_input = await self._read_line()
              return user_input
         except EOFError: # Handle Ctrl+D or similar EOF signals gracefully
              return "exit"
@@ -85,34 +169,85 @@ class TerminalUI:
              self.console.print("\nInput cancelled.") # Provide feedback
              return "" # Return empty string to loop back to prompt
 
+    async def _read_line(self) -> str:
+        """Read one line from stdin, waiting on the event loop instead of a worker thread where possible."""
+        loop = asyncio.get_running_loop()
+        if "\n" not in self._stdin_buffer:
+            try:
+                fd = sys.stdin.fileno()
+                self._input_future = loop.create_future()
+                loop.add_reader(fd, self._on_stdin, fd)
+            except (AttributeError, ValueError, OSError, NotImplementedError):
+                # No selectable stdin (Windows event loop, regular file, ...): fall back to blocking input() in a thread
+                return await loop.run_in_executor(None, input)
+            try:
+                await self._input_future
+            finally:
+                loop.remove_reader(fd)
+                self._input_future = None
+        line, _, self._stdin_buffer = self._stdin_buffer.partition("\n")
+        return line[:-1] if line.endswith("\r") else line
+
+    def _on_stdin(self, fd: int):
+        """Reader callback: buffer available stdin data and resolve the pending future once a line is complete."""
+        future = self._input_future
+        if future is None or future.done():
+            return
+        # Read the fd directly: sys.stdin's own buffer could hold pasted lines the selector never reports
+        data = os.read(fd, 4096)
+        if self._stdin_decoder is None:
+            self._stdin_decoder = codecs.getincrementaldecoder(sys.stdin.encoding or "utf-8")(sys.stdin.errors or "strict")
+        try:
+            if not data: # EOF (Ctrl+D): hand back any partial line first, like input() would
+                if not self._stdin_buffer:
+                    future.set_exception(EOFError())
+                    return
+                self._stdin_buffer += self._stdin_decoder.decode(b"", final=True) + "\n"
+            else:
+                self._stdin_buffer += self._stdin_decoder.decode(data)
+        except UnicodeDecodeError as e:
+            # Drop the undecodable read and surface the error through the prompt loop, as input() would
+            self._stdin_decoder.reset()
+            self._stdin_buffer = ""
+            future.set_exception(e)
+            return
+        if "\n" in self._stdin_buffer:
+            future.set_result(None)
+
     def _get_cwd_display(self) -> str:
-         """Get a display string for the current working directory."""
-         try:
-             # Try to get relative path to home directory for tidiness
-             home = Path.home()
-             cwd_path = Path(self.current_dir)
-             if cwd_path == home:
+         """Get a display string for the current working directory, cached until the directory changes."""
+         if self._cwd_display_cache and self._cwd_display_cache[0] == self.current_dir:
+             return self._cwd_display_cache[1]
+         display = self._compute_cwd_display()
+         self._cwd_display_cache = (self.current_dir, display)
+         return display
+         
+    def _compute_cwd_display(self) -> str:
+         """Build the display string for the current working directory."""
+         cur = self.current_dir
+         # Try to get relative path to home directory for tidiness (plain string checks, no Path parsing)
+         home = self._home_str
+         if home is not None: # Skip if home dir couldn't be determined
+             if cur == home:
                   return "~"
-             try:
-                  rel_path = cwd_path.relative_to(home)
+             home_prefix = home if home.endswith(os.sep) else home + os.sep
+             if cur.startswith(home_prefix):
+                  rel_path = cur[len(home_prefix):]
                   # Limit length of relative path display too
-                  if len(str(rel_path)) > 30: 
-                      return f"~/.../{'/'.join(rel_path.parts[-2:])}"
-                  return f"~/" + str(rel_path)
-             except ValueError: # Not relative to home
-                  pass # Fall through to basename logic
-         except Exception:
-              pass # Fallback if home dir check fails
+                  if len(rel_path) > 30: 
+                      return f"~/.../{'/'.join(rel_path.rsplit(os.sep, 2)[-2:])}"
+                  return f"~/" + rel_path
+             # Not relative to home: fall through to basename logic
               
          # Default: show basename or short path
-         if len(self.current_dir) > 35:
-             path_parts = Path(self.current_dir).parts
+         if len(cur) > 35:
+             path_parts = cur.rsplit(os.sep, 2)
              if len(path_parts) > 2:
                   return os.path.join("...", path_parts[-2], path_parts[-1])
              else:
-                  return os.path.basename(self.current_dir)
+                  return os.path.basename(cur)
          else:
-             return self.current_dir
+             return cur
              
     def show_thinking(self, message: str = "Thinking"):
         """Placeholder: Show processing message. Main display handled by Live."""
@@ -123,9 +258,12 @@ class TerminalUI:
         
     def clear_thinking(self):
          """Clear the line where the thinking indicator might have been."""
-         # Overwrite the current line with spaces to ensure clearance
          # Useful after Live(transient=True) or if an error occurs
-         self.console.print(" " * (self.console.width -1) , end="\r")
+         if not self.console.is_terminal:
+             return # Nothing was drawn in place, so there is no line to clear
+         # Carriage return + erase-in-line, written directly instead of printing a width of spaces
+         self.console.file.write("\r\x1b[2K")
+         self.console.file.flush()
 
     def show_error(self, message: str):
         """Display error message."""
@@ -142,47 +280,41 @@ class TerminalUI:
              self.console.print(f"[{THEME_COLOR}]{message}[/]")
              self.console.print()
         
-    def _display_reasoning(self, reasoning: str):
-        """Display the extracted <think> content in a distinct way."""
+    def _build_reasoning_panel(self, reasoning: str) -> Panel:
+        """Build the panel showing the extracted <think> content in a distinct way."""
         # Use a Panel with a specific title and dimmed style
-        reasoning_panel = Panel(
+        return Panel(
             Markdown(reasoning.strip()), # Render reasoning as Markdown
             title="[dim]Reasoning[/dim]",
             border_style="dim cyan",
             padding=(0, 1),
             title_align="left"
         )
-        self.console.print(reasoning_panel)
 
-    def _parse_and_display_response(self, response: str, duration: Optional[float]):
-        """Parse response for <think> tags and display accordingly, with duration."""
-        think_pattern = re.compile(r"<think>(.*?)</think>", re.DOTALL | re.IGNORECASE)
-        reasoning_match = think_pattern.search(response)
-        
-        final_response = think_pattern.sub("", response).strip() # Remove think tags
-        
-        # Display duration first if available
-        # This is now printed by show_output before calling this function
-        # if duration is not None:
-        #      self.console.print(f"[dim](took {duration:.2f}s)[/dim]")
+    def _parse_response(self, response: str) -> List[Any]:
+        """Parse response for <think> tags and return the renderables to display."""
+        reasoning, final_response = _split_reasoning(response)
+        final_response = final_response.strip() # Remove surrounding whitespace left by think tags
+        renderables: List[Any] = []
              
-        if reasoning_match:
-            reasoning = reasoning_match.group(1)
-            self._display_reasoning(reasoning)
+        if reasoning is not None:
+            renderables.append(self._build_reasoning_panel(reasoning))
             
         if final_response:
              # Use Panel with Theme color title for the main response
+             plain = _MD_CHARS.isdisjoint(final_response) and not final_response[0].isdigit()
              response_panel = Panel(
-                Markdown(final_response),
+                Text(final_response) if plain else Markdown(final_response),
                 border_style=THEME_COLOR,
                 padding=(1, 1),
                 title=f"[{THEME_COLOR}]Perplexity Response[/]",
                 title_align="left"
              )
-             self.console.print(response_panel)
-        elif not reasoning_match:
+             renderables.append(response_panel)
+        elif reasoning is None:
              # If no reasoning and no final response, maybe show a message?
-             self.console.print("[dim](No response content)[/dim]")
+             renderables.append(self.console.render_str("[dim](No response content)[/dim]"))
+        return renderables
 
     def show_output(self, output: str, is_command_result: bool, duration: Optional[float] = None):
         """Display output, differentiating formats and handling reasoning/duration."""
@@ -195,19 +327,44 @@ class TerminalUI:
             return
             
         if is_command_result:
-            # Simple print for command results (ls, pwd, create, errors etc.)
-            self.console.print(output)
-        else:
-            # Print final duration before showing response parts
-            if duration is not None:
-                self.console.print(f"[dim](took {duration:.2f}s)[/dim]")
-            # Parse for <think> tags and display AI response 
-            self._parse_and_display_response(output, duration) # Pass duration for context if needed, though not used in parse func now
+            # Command results (ls, pwd, create, errors etc.) are plain text: skip markup parsing and
+            # highlighting (also keeps names like '[draft].txt' intact) and add the blank line in the same print
+            self.console.print(output, markup=False, highlight=False, soft_wrap=True, end="\n\n")
+            return
+            
+        # Duration, reasoning and response go out as one Group in a single print
+        renderables: List[Any] = []
+        if duration is not None:
+            renderables.append(self.console.render_str(f"[dim](took {duration:.2f}s)[/dim]")) # Same markup/highlighting as a plain print
+        renderables.extend(self._parse_response(output)) # Parse for <think> tags
+        renderables.append(Text()) # Blank line after any output (print's `end` doesn't apply to renderables)
             
-        self.console.print() # Add a blank line after any output
+        self.console.print(Group(*renderables))
         
-    async def interactive_prompt(self, handler: Callable[..., Coroutine[Any, Any, Tuple[str, bool]]]):
-        """Start interactive prompt loop with Live display for thinking/timing."""
+    async def _collect_stream(self, chunks: AsyncIterable[str], buffer: List[str]) -> Tuple[str, bool]:
+        """Append streamed response chunks to buffer (read by the Live display) and return the full text."""
+        async for chunk in chunks:
+            buffer.append(chunk)
+        return "".join(buffer), False
+
+    async def _abandon_turn(self):
+        """Cancel the in-flight handler task and close any response stream it produced, releasing its connection."""
+        task, self.current_task = self.current_task, None
+        stream, self._current_stream = self._current_stream, None
+        if task is not None:
+            if not task.done():
+                task.cancel()
+                await asyncio.wait({task}, timeout=0.5)
+            if task.done() and not task.cancelled() and task.exception() is None and not isinstance(task.result(), tuple):
+                stream = task.result() # Handler returned a stream nobody started reading
+        if stream is not None and hasattr(stream, "aclose"):
+            await stream.aclose()
+
+    async def interactive_prompt(self, handler: Callable[..., Coroutine[Any, Any, Union[Tuple[str, bool], AsyncIterable[str]]]]):
+        """Start interactive prompt loop with Live display for thinking/timing.
+           The handler returns (response, is_command) or an AsyncIterable of AI response chunks
+           (with an aclose() to release it early), shown in the Live display as they arrive.
+        """
         while True:
             self.current_task = None # Clear previous task reference
             start_time = None # Reset start time for each loop
@@ -216,19 +373,21 @@ class TerminalUI:
                 if not command:
                      continue # Loop back on empty input (e.g., Ctrl+C during input)
                      
-                if command.lower().strip() in ["exit", "quit"]:
+                cmd_check = command.strip().lower()
+                if not cmd_check:
+                     continue # Whitespace-only input: nothing to run
+                if cmd_check in ("exit", "quit"):
                     self.show_success("Goodbye!")
                     break
                     
                 # --- Assume API call might happen, prepare Live display --- 
                 # We need to know *beforehand* if it's a local command or API call
                 # Let's add a quick check based on the command structure
-                is_likely_local = False
-                cmd_check = command.lower().strip().split(maxsplit=1)[0]
+                sp = cmd_check.find(" ")
+                if sp >= 0:
+                    cmd_check = cmd_check[:sp] # First word only
                 # Check against known local command prefixes (could be more robust)
-                local_prefixes = ["ls", "tree", "cd", "pwd", "create", "touch", "mkdir", "rm", "delete", "remove", "help"]
-                if cmd_check in local_prefixes:
-                     is_likely_local = True
+                is_likely_local = cmd_check in self.LOCAL_PREFIXES
                 # Add checks for natural language patterns if needed, but keep it simple for now
 
                 if is_likely_local:
@@ -247,30 +406,47 @@ class TerminalUI:
 
                     # --- Live display section --- 
                     spinner = Spinner("dots", style=THEME_COLOR)
-                    thinking_text = Text("Thinking", style=THEME_COLOR)
-                    timer_text = Text("(0.00s)", style="dim") # Initial timer text
+                    thinking_text = Text("Thinking", style=THEME_COLOR) # Static prefix, built once
+                    stream_buffer: List[str] = [] # Response chunks received so far (streaming handlers only)
+                    stream_view: List[Any] = [0, None] # [chunk count, renderable] last built; rebuilt only when chunks arrive
 
                     def get_renderable():
-                        # Create a new Text object each time to ensure fresh state
-                        current_time = time.monotonic()
-                        display = Text()
-                        display.append(thinking_text)
-                        display.append(" ")
-                        # Pass current time for frame calculation
-                        display.append(spinner.render(current_time))
-                        display.append(" ")
-                        display.append(timer_text)
-                        return display
+                        # Called by Live on each auto-refresh; one assemble per frame instead of incremental appends
+                        current_time = time.monotonic() # Single clock read per frame, shared by spinner and timer
+                        header = Text.assemble(
+                            thinking_text,
+                            " ",
+                            spinner.render(current_time), # Pass current time for frame calculation
+                            " ",
+                            (f"({current_time - start_time:.2f}s)", "dim")
+                        )
+                        count = len(stream_buffer)
+                        if not count:
+                            return header
+                        if count != stream_view[0]: # At most one Markdown parse per refresh
+                            # Keep <think> content out of the Markdown: shown dimmed, the answer below it
+                            reasoning, answer = _split_partial_reasoning("".join(stream_buffer[:count]))
+                            parts = []
+                            if reasoning and reasoning.strip():
+                                parts.append(Text(reasoning.strip(), style=THINKING_COLOR))
+                            if answer.strip():
+                                parts.append(Markdown(answer.strip()))
+                            stream_view[0], stream_view[1] = count, Group(*parts)
+                        return Group(header, stream_view[1])
 
-                    with Live(get_renderable(), console=self.console, refresh_per_second=10, transient=True) as live:
-                        while not self.current_task.done():
-                            elapsed = time.monotonic() - start_time
-                            timer_text.plain = f"({elapsed:.2f}s)"
-                            live.update(get_renderable())
-                            await asyncio.sleep(0.1)
+                    # Live redraws from its own refresh thread, so just wait for the task to finish
+                    with Live(console=self.console, refresh_per_second=10, auto_refresh=True, transient=True, get_renderable=get_renderable):
+                        await asyncio.wait({self.current_task})
+                        result = self.current_task.result()
+                        if not isinstance(result, tuple):
+                            # Streaming response: collect chunks in a task so Ctrl+C can still cancel it
+                            self._current_stream = result
+                            self.current_task = asyncio.create_task(self._collect_stream(result, stream_buffer))
+                            await asyncio.wait({self.current_task})
 
                     response, is_command = await self.current_task 
                     end_time = time.monotonic()
+                    self._current_stream = None
                     # Live context exited, display is cleaned up
                     
                     self.current_task = None
@@ -297,20 +473,26 @@ class TerminalUI:
                     self.console.print() # Ensure we are on a new line after ^C
                      # self.console.print("\nOperation cancelled.") # Maybe redundant
                 # self.console.print() # Extra newline for clarity - might be too much now
+                await self._abandon_turn() # Release any response stream left open
                      
             except asyncio.CancelledError:
                  self.clear_thinking() # Ensure line is clear
                  self.console.print("\n[yellow]Operation cancelled externally.[/yellow]")
-                 self.current_task = None
+                 await self._abandon_turn() # Stop the request and close any stream it already returned
                  
             except Exception as e:
                 self.clear_thinking() # Ensure line is clear
-                import traceback
-                self.show_error(f"Unexpected error in main loop: {str(e)}\n{traceback.format_exc()}")
-                if self.current_task and not self.current_task.done():
-                    self.current_task.cancel()
-                self.current_task = None
+                # Show the error first; the stack walk and formatting happen in a worker thread afterwards
+                self.show_error(f"Unexpected error in main loop: {str(e)}")
+                tb_lines = await asyncio.get_running_loop().run_in_executor(
+                    None, functools.partial(traceback.format_exception, type(e), e, e.__traceback__) # 3-arg form works on 3.9
+                )
+                self.console.print("".join(tb_lines), style="dim", markup=False, highlight=False)
+                await self._abandon_turn()
                 
     def update_current_dir(self, new_dir: str):
         """Update the current working directory state for the prompt."""
+        if new_dir != self.current_dir:
+            self._cwd_display_cache = None
+            self._prompt_cache = None
         self.current_dir = new_dir 
\ No newline at end of file
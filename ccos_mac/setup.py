@@ -7,8 +7,9 @@ setup(
     install_requires=[
         "typer",
         "rich",
-        "httpx",
-        "pydantic"
+        "httpx[http2]",
+        "pydantic",
+        "orjson"
     ],
     entry_points={
         "console_scripts": [